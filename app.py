@@ -1,3 +1,5 @@
+import json
+
 import streamlit as st
 from pathlib import Path
 
@@ -10,9 +12,13 @@ from chat import (
     save_message,
     delete_chat,
     add_file_record,
+    chat_has_document,
 )
 from file_utils import save_uploaded_file, ensure_extracted_text
 from utils.ollama_client import chat_with_model
+from summarizer import summarize_document
+from tracing import trace_turn, get_slowest_turns
+from config.settings import ADMIN_USERS
 
 # ======================================================
 # APP CONFIG
@@ -32,9 +38,10 @@ st.session_state.setdefault("authenticated", False)
 st.session_state.setdefault("username", None)
 st.session_state.setdefault("chat_id", None)
 
-st.session_state.setdefault("has_document", {})  # chat_id -> bool
-st.session_state.setdefault("upload_notice", {})  # chat_id -> str | None
+# Per-chat flags (has document, upload notice) live in the database so
+# any replica can serve this session.
 st.session_state.setdefault("files_to_process", None)  # TEMP buffer
+st.session_state.setdefault("show_slow_turns", False)  # admin page toggle
 
 # ======================================================
 # HEADER
@@ -88,6 +95,11 @@ else:
         st.session_state.clear()
         st.rerun()
 
+    is_admin = st.session_state.username in ADMIN_USERS
+    if is_admin and st.sidebar.button("📊 Slow Turns", use_container_width=True):
+        st.session_state.show_slow_turns = not st.session_state.show_slow_turns
+        st.rerun()
+
     st.sidebar.divider()
     st.sidebar.markdown("### 💬 Chats")
 
@@ -96,8 +108,6 @@ else:
     if st.sidebar.button("➕ New Chat", use_container_width=True):
         cid = create_chat(st.session_state.username)
         st.session_state.chat_id = cid
-        st.session_state.has_document[cid] = False
-        st.session_state.upload_notice[cid] = None
         st.rerun()
 
     for cid, title in chats:
@@ -107,19 +117,56 @@ else:
             st.rerun()
         if c2.button("🗑️", key=f"del_{cid}"):
             delete_chat(cid)
-            st.session_state.has_document.pop(cid, None)
-            st.session_state.upload_notice.pop(cid, None)
             if st.session_state.chat_id == cid:
                 st.session_state.chat_id = None
             st.rerun()
 
+    # ======================================================
+    # ADMIN: SLOWEST TURNS (STAGE BREAKDOWN)
+    # ======================================================
+    if is_admin and st.session_state.show_slow_turns:
+        st.markdown("### 📊 Slowest turns")
+        rows = []
+        for (
+            created_at,
+            user,
+            cid,
+            kind,
+            total_ms,
+            stages,
+            prompt_eval_count,
+            prompt_eval_ms,
+            eval_count,
+            eval_ms,
+            load_ms,
+        ) in get_slowest_turns():
+            rows.append(
+                {
+                    "when": str(created_at),
+                    "user": user,
+                    "chat": cid,
+                    "kind": kind,
+                    "total_ms": total_ms,
+                    "prompt_tokens": prompt_eval_count,
+                    "prompt_eval_ms": prompt_eval_ms,
+                    "gen_tokens": eval_count,
+                    "eval_ms": eval_ms,
+                    "load_ms": load_ms,
+                    **json.loads(stages),
+                }
+            )
+
+        if rows:
+            st.dataframe(rows, use_container_width=True)
+        else:
+            st.info("No traces recorded yet.")
+        st.stop()
+
     if not st.session_state.chat_id:
         st.info("👈 Create or select a chat to begin.")
         st.stop()
 
     chat_id = st.session_state.chat_id
-    st.session_state.has_document.setdefault(chat_id, False)
-    st.session_state.upload_notice.setdefault(chat_id, None)
 
     # ======================================================
     # FILE UPLOAD (ZERO PROCESSING HERE)
@@ -158,30 +205,23 @@ else:
     files = st.session_state.pop("files_to_process", None)
 
     if files:
+        notice = None
         for f in files:
-            save_uploaded_file(chat_id, f)
-            add_file_record(chat_id, f.name, f"data/uploads/{chat_id}/{f.name}")
+            file_path = save_uploaded_file(chat_id, f)
+            add_file_record(chat_id, f.name, str(file_path))
 
             if f.name.lower().endswith(("png", "jpg", "jpeg")):
-                st.session_state.upload_notice[chat_id] = "image"
+                notice = notice or "image"
             else:
-                st.session_state.has_document[chat_id] = True
-                st.session_state.upload_notice[chat_id] = "document"
+                notice = "document"
 
-        st.rerun()
-
-    # ======================================================
-    # UPLOAD NOTICE (ONCE)
-    # ======================================================
-    notice = st.session_state.upload_notice.get(chat_id)
-    if notice:
+        # UPLOAD NOTICE (ONCE) → written straight to the chat history
         msg = (
             "🖼️ **Image uploaded successfully.**\n\nAsk anything about it."
             if notice == "image"
             else "📄 **Document uploaded successfully.**\n\nClick **Summarize Uploaded Document**."
         )
         save_message(chat_id, "assistant", msg)
-        st.session_state.upload_notice[chat_id] = None
         st.rerun()
 
     # ======================================================
@@ -190,19 +230,28 @@ else:
     messages = get_messages(chat_id)
 
     # -------- SUMMARIZE BUTTON (LAZY & FAST) --------
-    if st.session_state.has_document.get(chat_id):
+    if chat_has_document(chat_id):
         if st.button("📄 Summarize Uploaded Document", use_container_width=True):
-            with st.spinner("Reading and summarizing document..."):
-                ensure_extracted_text(chat_id)
+            with st.spinner("Reading and summarizing document..."), trace_turn(
+                "summarize", chat_id, st.session_state.username
+            ):
+                extracted_file = ensure_extracted_text(chat_id)
 
                 prompt = "Summarize the uploaded document clearly and concisely."
                 save_message(chat_id, "user", prompt)
 
-                reply = chat_with_model(
+                # Map-reduce over chunks → works past the model context window
+                bar = st.progress(0.0, text="Splitting document...")
+
+                def report(label, done, total):
+                    bar.progress(done / total, text=f"{label} ({done}/{total})")
+
+                reply = summarize_document(
+                    extracted_file.read_text(encoding="utf-8", errors="ignore"),
                     "gemma3:1b",
-                    get_messages(chat_id) + [("user", prompt)],
-                    chat_id=chat_id,
+                    progress=report,
                 )
+                bar.empty()
 
                 save_message(chat_id, "assistant", reply)
 
@@ -227,13 +276,14 @@ else:
     user_input = st.chat_input("Ask something...")
 
     if user_input:
-        save_message(chat_id, "user", user_input)
+        with trace_turn("chat", chat_id, st.session_state.username):
+            save_message(chat_id, "user", user_input)
 
-        reply = chat_with_model(
-            "gemma3:1b",
-            get_messages(chat_id) + [("user", user_input)],
-            chat_id=chat_id,
-        )
+            reply = chat_with_model(
+                "gemma3:1b",
+                get_messages(chat_id) + [("user", user_input)],
+                chat_id=chat_id,
+            )
 
-        save_message(chat_id, "assistant", reply)
+            save_message(chat_id, "assistant", reply)
         st.rerun()
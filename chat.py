@@ -1,8 +1,11 @@
-from storage import get_connection
+from storage import connection
+from tracing import span
 from utils.logger import setup_logger
 
 logger = setup_logger("chat")
 
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+
 
 # =========================
 # CHAT CRUD
@@ -10,81 +13,77 @@ logger = setup_logger("chat")
 
 
 def create_chat(username: str, title="New Chat"):
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute(
-        "INSERT INTO chats (username, title) VALUES (?, ?)",
-        (username, title),
-    )
-    chat_id = cur.lastrowid
-    conn.commit()
-    conn.close()
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            "INSERT INTO chats (username, title) VALUES (?, ?) RETURNING id",
+            (username, title),
+        )
+        chat_id = cur.fetchone()[0]
+        conn.commit()
     logger.info(f"Chat created: {chat_id} for {username}")
     return chat_id
 
 
 def get_user_chats(username: str):
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute(
-        "SELECT id, title FROM chats WHERE username = ? ORDER BY created_at DESC",
-        (username,),
-    )
-    rows = cur.fetchall()
-    conn.close()
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            "SELECT id, title FROM chats WHERE username = ? ORDER BY created_at DESC, id DESC",
+            (username,),
+        )
+        rows = cur.fetchall()
     return rows
 
 
 def get_messages(chat_id: int):
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute(
-        "SELECT role, content FROM messages WHERE chat_id = ? ORDER BY timestamp",
-        (chat_id,),
-    )
-    rows = cur.fetchall()
-    conn.close()
+    with span("db_read_messages"):
+        with connection() as conn:
+            cur = conn.cursor()
+            cur.execute(
+                "SELECT role, content FROM messages WHERE chat_id = ? ORDER BY timestamp, id",
+                (chat_id,),
+            )
+            rows = cur.fetchall()
     return rows
 
 
 def save_message(chat_id: int, role: str, content: str):
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute(
-        "INSERT INTO messages (chat_id, role, content) VALUES (?, ?, ?)",
-        (chat_id, role, content),
-    )
-    conn.commit()
-    conn.close()
+    with span("db_write_message"):
+        with connection() as conn:
+            cur = conn.cursor()
+            cur.execute(
+                "INSERT INTO messages (chat_id, role, content) VALUES (?, ?, ?)",
+                (chat_id, role, content),
+            )
+            conn.commit()
 
 
 def rename_chat(chat_id: int, new_title: str):
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute(
-        "UPDATE chats SET title = ? WHERE id = ?",
-        (new_title, chat_id),
-    )
-    conn.commit()
-    conn.close()
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            "UPDATE chats SET title = ? WHERE id = ?",
+            (new_title, chat_id),
+        )
+        conn.commit()
     logger.info(f"Chat renamed: {chat_id} -> {new_title}")
 
 
 def delete_chat(chat_id: int):
-    conn = get_connection()
-    cur = conn.cursor()
+    with connection() as conn:
+        cur = conn.cursor()
 
-    # delete messages
-    cur.execute("DELETE FROM messages WHERE chat_id = ?", (chat_id,))
+        # delete messages
+        cur.execute("DELETE FROM messages WHERE chat_id = ?", (chat_id,))
 
-    # delete files
-    cur.execute("DELETE FROM chat_files WHERE chat_id = ?", (chat_id,))
+        # delete files
+        cur.execute("DELETE FROM chat_files WHERE chat_id = ?", (chat_id,))
 
-    # delete chat
-    cur.execute("DELETE FROM chats WHERE id = ?", (chat_id,))
+        # delete chat
+        cur.execute("DELETE FROM chats WHERE id = ?", (chat_id,))
 
-    conn.commit()
-    conn.close()
+        conn.commit()
     logger.info(f"Chat deleted: {chat_id}")
 
 
@@ -94,23 +93,31 @@ def delete_chat(chat_id: int):
 
 
 def add_file_record(chat_id: int, filename: str, filepath: str):
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute(
-        "INSERT INTO chat_files (chat_id, filename, filepath) VALUES (?, ?, ?)",
-        (chat_id, filename, filepath),
-    )
-    conn.commit()
-    conn.close()
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            "INSERT INTO chat_files (chat_id, filename, filepath) VALUES (?, ?, ?)",
+            (chat_id, filename, filepath),
+        )
+        conn.commit()
 
 
 def get_files_for_chat(chat_id: int):
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute(
-        "SELECT filename, filepath FROM chat_files WHERE chat_id = ?",
-        (chat_id,),
-    )
-    rows = cur.fetchall()
-    conn.close()
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            "SELECT filename, filepath FROM chat_files WHERE chat_id = ?",
+            (chat_id,),
+        )
+        rows = cur.fetchall()
     return rows
+
+
+def chat_has_document(chat_id: int) -> bool:
+    """
+    Derived from chat_files (not session memory) so any replica can answer.
+    """
+    return any(
+        not filename.lower().endswith(IMAGE_EXTENSIONS)
+        for filename, _ in get_files_for_chat(chat_id)
+    )
@@ -1,14 +1,21 @@
+import math
 from pathlib import Path
 from pypdf import PdfReader
 import pandas as pd
 
+from text_normalizer import estimate_tokens
 
-def extract_text_from_file(file_path: str) -> str:
+
+def extract_text_from_file(file_path: str):
+    """
+    Returns (text, raw_tokens): the extracted text and a token estimate of
+    its uncompacted form, so the normalization report shows the real saving.
+    """
     path = Path(file_path)
     suffix = path.suffix.lower()
 
     if suffix == ".pdf":
-        return extract_pdf(path)
+        text = extract_pdf(path)
 
     elif suffix in [".csv"]:
         return extract_csv(path)
@@ -17,10 +24,12 @@ def extract_text_from_file(file_path: str) -> str:
         return extract_excel(path)
 
     elif suffix in [".txt", ".py", ".js", ".md"]:
-        return extract_text_file(path)
+        text = extract_text_file(path)
 
     else:
-        return "Unsupported file type"
+        text = "Unsupported file type"
+
+    return text, estimate_tokens(text)
 
 
 def extract_pdf(path: Path) -> str:
@@ -28,17 +37,30 @@ def extract_pdf(path: Path) -> str:
     text = []
     for page in reader.pages:
         text.append(page.extract_text() or "")
-    return "\n".join(text)
+    # Form feed between pages lets the summarizer split at page boundaries
+    return "\f".join(text)
+
+
+def extract_csv(path: Path):
+    return table_to_text(pd.read_csv(path))
 
 
-def extract_csv(path: Path) -> str:
-    df = pd.read_csv(path)
-    return df.to_string(index=False)
+def extract_excel(path: Path):
+    return table_to_text(pd.read_excel(path))
 
 
-def extract_excel(path: Path) -> str:
-    df = pd.read_excel(path)
-    return df.to_string(index=False)
+def table_to_text(df: pd.DataFrame):
+    """
+    Delimited, not to_string(): column padding is mostly whitespace tokens.
+    The padded size is estimated from column widths instead of rendered.
+    """
+    widths = [
+        max(len(str(col)), int(df[col].astype(str).str.len().max()) if len(df) else 0)
+        for col in df.columns
+    ]
+    # one space between columns, one newline per row, header row included
+    padded_chars = (sum(widths) + len(widths)) * (len(df) + 1)
+    return df.to_csv(index=False), math.ceil(padded_chars / 4)
 
 
 def extract_text_file(path: Path) -> str:
@@ -1,9 +1,10 @@
-from pathlib import Path
-
-
 from file_text_extractor import extract_text_from_file
+from storage import UPLOAD_BASE
+from text_normalizer import estimate_tokens, normalize_text
+from tracing import span
+from utils.logger import setup_logger
 
-UPLOAD_BASE = Path("data/uploads")
+logger = setup_logger("file_utils")
 
 MAX_FILE_SIZE_MB = 5  # option 2
 
@@ -18,13 +19,16 @@ def save_uploaded_file(chat_id: int, uploaded_file):
     with open(file_path, "wb") as f:
         f.write(uploaded_file.getbuffer())
 
+    # New upload → stale extraction, rebuild on next demand
+    (chat_dir / "extracted_text.txt").unlink(missing_ok=True)
+
     return file_path
 
 
 def ensure_extracted_text(chat_id: int):
     """
     Extract document text ONLY ON DEMAND.
-    Runs once per chat.
+    Runs once per chat, and again after each new upload.
     """
 
     chat_dir = UPLOAD_BASE / str(chat_id)
@@ -37,7 +41,7 @@ def ensure_extracted_text(chat_id: int):
     extracted_file.parent.mkdir(parents=True, exist_ok=True)
 
     with open(extracted_file, "w", encoding="utf-8") as out:
-        for f in chat_dir.iterdir():
+        for f in sorted(chat_dir.iterdir()):
             if f.name == "extracted_text.txt":
                 continue
             if not f.is_file():
@@ -55,12 +59,23 @@ def ensure_extracted_text(chat_id: int):
                 )
                 continue
 
-            raw_text = extract_text_from_file(str(f))
+            with span("extract"):
+                raw_text, before = extract_text_from_file(str(f))
             if not raw_text:
                 continue
 
             cleaned = raw_text.encode("utf-8", errors="ignore").decode("utf-8")
 
+            with span("normalize"):
+                normalized = normalize_text(cleaned, f.suffix)
+
+            after = estimate_tokens(normalized)
+            logger.info(
+                f"Normalized {f.name}: ~{before} → ~{after} tokens "
+                f"({100 * (before - after) / max(before, 1):.0f}% saved)"
+            )
+            cleaned = normalized
+
             out.write("\n\n========== FILE START ==========\n")
             out.write(cleaned)
             out.write("\n=========== FILE END ===========\n")
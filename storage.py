@@ -1,66 +1,324 @@
+import csv
 import sqlite3
+import threading
+from contextlib import contextmanager, suppress
+from functools import lru_cache
 from pathlib import Path
 
-DB_PATH = Path("data/app.db")
+from config.settings import (
+    BLOB_DIR,
+    DATABASE_URL,
+    DB_POOL_MAX,
+    DB_POOL_MIN,
+    STORAGE_BACKEND,
+)
 
+POOL_WAIT_SECONDS = 30
 
-def get_connection():
-    DB_PATH.parent.mkdir(exist_ok=True)
-    return sqlite3.connect(DB_PATH, check_same_thread=False)
+DB_PATH = Path("data/app.db")
+USERS_FILE = Path("data/users.csv")
+UPLOAD_BASE = Path(BLOB_DIR)
 
+USER_FIELDNAMES = ["username", "password_hash"]
 
-def init_db():
-    conn = get_connection()
-    cur = conn.cursor()
-
-    # ---------- USERS (unused for now, future-ready) ----------
-    cur.execute(
-        """
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE,
-            password_hash TEXT
-        )
-        """
+# {pk} is filled in per backend (SQLite AUTOINCREMENT vs PostgreSQL SERIAL)
+SCHEMA = [
+    # ---------- USERS (postgres backend; sqlite keeps users.csv) ----------
+    """
+    CREATE TABLE IF NOT EXISTS users (
+        id {pk},
+        username TEXT UNIQUE,
+        password_hash TEXT
     )
-
+    """,
     # ---------- CHATS ----------
-    cur.execute(
-        """
-        CREATE TABLE IF NOT EXISTS chats (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT,
-            title TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        """
+    """
+    CREATE TABLE IF NOT EXISTS chats (
+        id {pk},
+        username TEXT,
+        title TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
     )
-
+    """,
     # ---------- MESSAGES ----------
-    cur.execute(
-        """
-        CREATE TABLE IF NOT EXISTS messages (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            chat_id INTEGER,
-            role TEXT,
-            content TEXT,
-            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        """
+    """
+    CREATE TABLE IF NOT EXISTS messages (
+        id {pk},
+        chat_id INTEGER,
+        role TEXT,
+        content TEXT,
+        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
     )
-
+    """,
     # ---------- CHAT FILES (NEW – REQUIRED) ----------
-    cur.execute(
-        """
-        CREATE TABLE IF NOT EXISTS chat_files (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            chat_id INTEGER,
-            filename TEXT,
-            filepath TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        """
+    """
+    CREATE TABLE IF NOT EXISTS chat_files (
+        id {pk},
+        chat_id INTEGER,
+        filename TEXT,
+        filepath TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    # ---------- SUMMARY CACHE (partial summaries by chunk hash) ----------
+    """
+    CREATE TABLE IF NOT EXISTS summary_cache (
+        chunk_hash TEXT PRIMARY KEY,
+        summary TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    # ---------- TURN TRACES (sampled + every slow turn) ----------
+    """
+    CREATE TABLE IF NOT EXISTS turn_traces (
+        id {pk},
+        chat_id INTEGER,
+        username TEXT,
+        kind TEXT,
+        total_ms REAL,
+        stages TEXT,
+        prompt_eval_count INTEGER,
+        prompt_eval_ms REAL,
+        eval_count INTEGER,
+        eval_ms REAL,
+        load_ms REAL,
+        slow INTEGER,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
     )
+    """,
+]
+
+
+# =========================
+# SQLITE + LOCAL DISK
+# =========================
+
+
+class SQLiteStorage:
+    """
+    Current single-replica setup: data/app.db, data/users.csv, local uploads.
+    """
+
+    pk = "INTEGER PRIMARY KEY AUTOINCREMENT"
+
+    def connect(self):
+        DB_PATH.parent.mkdir(exist_ok=True)
+        return sqlite3.connect(DB_PATH, check_same_thread=False)
+
+    def _ensure_users_file(self):
+        USERS_FILE.parent.mkdir(exist_ok=True)
+        if not USERS_FILE.exists():
+            with open(USERS_FILE, "w", newline="") as f:
+                writer = csv.DictWriter(f, fieldnames=USER_FIELDNAMES)
+                writer.writeheader()
+
+    def _read_users(self):
+        self._ensure_users_file()
+        with open(USERS_FILE, "r", newline="") as f:
+            reader = csv.DictReader(f)
+            if reader.fieldnames != USER_FIELDNAMES:
+                raise RuntimeError(
+                    f"Invalid users.csv format. Expected headers: {USER_FIELDNAMES}"
+                )
+            return list(reader)
+
+    def get_password_hash(self, username: str):
+        for user in self._read_users():
+            if user["username"] == username:
+                return user["password_hash"]
+        return None
+
+    def create_user(self, username: str, password_hash: str) -> bool:
+        if self.get_password_hash(username) is not None:
+            return False
+
+        with open(USERS_FILE, "a", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=USER_FIELDNAMES)
+            writer.writerow({"username": username, "password_hash": password_hash})
+        return True
+
+
+# =========================
+# POSTGRESQL (POOLED) + SHARED BLOB DIR
+# =========================
+
+
+@lru_cache(maxsize=256)
+def _to_pyformat(sql: str) -> str:
+    """
+    "?" → "%s" outside quoted literals; literal "%" → "%%" so psycopg2
+    doesn't read it as a placeholder (e.g. LIKE 'abc%').
+    """
+    out = []
+    quote = None
+    for ch in sql:
+        if ch == "%":
+            out.append("%%")
+        elif quote:
+            out.append(ch)
+            if ch == quote:
+                quote = None
+        elif ch in ("'", '"'):
+            quote = ch
+            out.append(ch)
+        elif ch == "?":
+            out.append("%s")
+        else:
+            out.append(ch)
+    return "".join(out)
+
+
+class _PooledCursor:
+    """
+    Accepts the sqlite-style "?" placeholders used throughout the app.
+    """
+
+    def __init__(self, cur):
+        self._cur = cur
+
+    def execute(self, sql, params=()):
+        return self._cur.execute(_to_pyformat(sql), params)
+
+    def fetchone(self):
+        return self._cur.fetchone()
+
+    def fetchall(self):
+        return self._cur.fetchall()
+
+    @property
+    def rowcount(self):
+        return self._cur.rowcount
+
+
+class _PooledConnection:
+    """
+    close() hands the connection back to the pool instead of closing it.
+    """
+
+    def __init__(self, storage, conn):
+        self._storage = storage
+        self._conn = conn
+
+    def cursor(self):
+        return _PooledCursor(self._conn.cursor())
+
+    def commit(self):
+        self._conn.commit()
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def close(self):
+        if self._conn is not None:
+            self._storage.release(self._conn)
+            self._conn = None
+
+
+class PostgresStorage:
+    """
+    Multi-replica setup: every pod talks to the same PostgreSQL server and
+    mounts the same BLOB_DIR (e.g. a ReadWriteMany volume).
+    """
+
+    pk = "SERIAL PRIMARY KEY"
+
+    def __init__(self, dsn: str, minconn: int, maxconn: int):
+        # Optional dependency, only needed when STORAGE_BACKEND=postgres
+        from psycopg2.pool import ThreadedConnectionPool
+
+        self._pool = ThreadedConnectionPool(minconn, maxconn, dsn)
+        # getconn() raises PoolError when exhausted → wait for a free slot instead
+        self._slots = threading.BoundedSemaphore(maxconn)
+
+    def connect(self):
+        if not self._slots.acquire(timeout=POOL_WAIT_SECONDS):
+            raise RuntimeError("Timed out waiting for a database connection")
+        try:
+            return _PooledConnection(self, self._pool.getconn())
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, conn):
+        try:
+            # pool rolls back anything left uncommitted, drops broken connections
+            self._pool.putconn(conn)
+        finally:
+            self._slots.release()
+
+    def get_password_hash(self, username: str):
+        with connection() as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT password_hash FROM users WHERE username = ?", (username,))
+            row = cur.fetchone()
+        return row[0] if row else None
+
+    def create_user(self, username: str, password_hash: str) -> bool:
+        with connection() as conn:
+            cur = conn.cursor()
+            cur.execute(
+                "INSERT INTO users (username, password_hash) VALUES (?, ?) "
+                "ON CONFLICT (username) DO NOTHING",
+                (username, password_hash),
+            )
+            created = cur.rowcount == 1
+            conn.commit()
+        return created
+
+
+# =========================
+# BACKEND SELECTION
+# =========================
+
+_backend = None
+_backend_lock = threading.Lock()
+_initialized = False
+
+
+def get_backend():
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            if STORAGE_BACKEND == "sqlite":
+                _backend = SQLiteStorage()
+            elif STORAGE_BACKEND == "postgres":
+                _backend = PostgresStorage(DATABASE_URL, DB_POOL_MIN, DB_POOL_MAX)
+            else:
+                raise RuntimeError(
+                    f"Unknown STORAGE_BACKEND: {STORAGE_BACKEND} (expected sqlite or postgres)"
+                )
+        return _backend
+
+
+@contextmanager
+def connection():
+    """
+    Borrow a connection; always closed (returned to the pool), rolled back on error.
+    """
+    conn = get_backend().connect()
+    try:
+        yield conn
+    except Exception:
+        # A dead connection can't roll back; the pool discards it on close
+        with suppress(Exception):
+            conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def init_db():
+    # Streamlit calls this on every rerun → run the DDL once per process
+    global _initialized
+    if _initialized:
+        return
+
+    backend = get_backend()
+    with connection() as conn:
+        cur = conn.cursor()
+
+        for statement in SCHEMA:
+            cur.execute(statement.format(pk=backend.pk))
 
-    conn.commit()
-    conn.close()
+        conn.commit()
+    _initialized = True
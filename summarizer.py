@@ -0,0 +1,237 @@
+import contextvars
+import hashlib
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from config.settings import SUMMARY_CHUNK_CHARS, SUMMARY_CONCURRENCY
+from storage import connection
+from utils.logger import setup_logger
+from utils.ollama_client import generate_completion
+
+logger = setup_logger("summarizer")
+
+FILE_BLOCK = re.compile(r"=+ FILE START =+\n(.*?)\n=+ FILE END =+", re.S)
+SKIP_NOTICE = re.compile(r"⚠️ FILE SKIPPED .*")
+PAGE_BREAK = "\f"
+
+# Process-wide cap on in-flight Ollama calls, shared by every session
+_ollama_slots = threading.BoundedSemaphore(SUMMARY_CONCURRENCY)
+
+MAP_PROMPT = """Summarize the following part of a document.
+Keep every important fact, figure, name and conclusion. Be concise.
+
+<Document Part>
+{text}
+</Document Part>
+"""
+
+REDUCE_PROMPT = """The following are summaries of consecutive parts of the same document.
+Merge them into one clear, concise summary. Do not repeat points.
+
+<Partial Summaries>
+{text}
+</Partial Summaries>
+"""
+
+ERROR_REPLY = "⚠️ Error communicating with Ollama. Is Ollama running?"
+
+
+# =========================
+# SUMMARY CACHE
+# =========================
+
+
+def _chunk_hash(model: str, kind: str, text: str) -> str:
+    return hashlib.sha256(f"{model}\0{kind}\0{text}".encode()).hexdigest()
+
+
+def get_cached_summaries(hashes: list) -> dict:
+    if not hashes:
+        return {}
+
+    with connection() as conn:
+        cur = conn.cursor()
+        placeholders = ", ".join("?" for _ in hashes)
+        cur.execute(
+            f"SELECT chunk_hash, summary FROM summary_cache WHERE chunk_hash IN ({placeholders})",
+            list(hashes),
+        )
+        rows = cur.fetchall()
+    return dict(rows)
+
+
+def cache_summary(chunk_hash: str, summary: str):
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            "INSERT INTO summary_cache (chunk_hash, summary) VALUES (?, ?) "
+            "ON CONFLICT (chunk_hash) DO NOTHING",
+            (chunk_hash, summary),
+        )
+        conn.commit()
+
+
+# =========================
+# CHUNKING
+# =========================
+
+
+def _split_oversized(section: str, limit: int) -> list:
+    if len(section) <= limit:
+        return [section]
+
+    pieces = []
+    for para in re.split(r"\n\s*\n", section):
+        para = para.strip()
+        while len(para) > limit:
+            pieces.append(para[:limit])
+            para = para[limit:]
+        if para:
+            pieces.append(para)
+    return pieces
+
+
+def _pack(sections: list, limit: int, sep: str = "\n\n") -> list:
+    chunks = []
+    current = ""
+    for section in sections:
+        if current and len(current) + len(sep) + len(section) > limit:
+            chunks.append(current)
+            current = section
+        else:
+            current = f"{current}{sep}{section}" if current else section
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def split_into_chunks(text: str, limit: int = SUMMARY_CHUNK_CHARS) -> list:
+    """
+    Split the FILE blocks of extracted text at page boundaries, then pack the pieces
+    into chunks of at most `limit` characters. Chunks never span two files,
+    so adding a file leaves the chunks (and cache keys) of the others intact.
+    """
+
+    chunks = []
+    for body in FILE_BLOCK.findall(text):
+        sections = []
+        for page in body.split(PAGE_BREAK):
+            page = page.strip()
+            if page:
+                sections.extend(_split_oversized(page, limit))
+        chunks.extend(_pack(sections, limit))
+    return chunks
+
+
+# =========================
+# MAP / REDUCE
+# =========================
+
+
+def _summarize(model: str, prompt: str, cancelled: threading.Event):
+    with _ollama_slots:
+        # Round already failed while this call waited for a slot
+        if cancelled.is_set():
+            return None
+        return generate_completion(model, prompt)
+
+
+def _run_round(model, kind, texts, template, label, progress):
+    """
+    Summarize `texts` concurrently, skipping anything already cached.
+    Results are returned in input order.
+    """
+
+    hashes = [_chunk_hash(model, kind, t) for t in texts]
+    results = get_cached_summaries(hashes)
+
+    pending = {h: t for h, t in zip(hashes, texts) if h not in results}
+
+    total = len(set(hashes))
+    done = total - len(pending)
+    if progress:
+        progress(label, done, total)
+
+    logger.info(f"{label}: {total} chunks, {done} cached")
+
+    cancelled = threading.Event()
+    pool = ThreadPoolExecutor(max_workers=SUMMARY_CONCURRENCY)
+    try:
+        futures = {
+            # copy_context → worker calls are recorded on the current trace
+            pool.submit(
+                contextvars.copy_context().run,
+                _summarize,
+                model,
+                template.format(text=t),
+                cancelled,
+            ): h
+            for h, t in pending.items()
+        }
+        for future in as_completed(futures):
+            h = futures[future]
+            results[h] = future.result()
+            cache_summary(h, results[h])
+            done += 1
+            if progress:
+                progress(label, done, total)
+    except Exception:
+        # Fail fast: drop queued chunks instead of running them for nothing
+        cancelled.set()
+        pool.shutdown(wait=False, cancel_futures=True)
+        raise
+    else:
+        pool.shutdown()
+
+    return [results[h] for h in hashes]
+
+
+def summarize_document(text: str, model: str, progress=None) -> str:
+    """
+    Hierarchical summarization: summarize chunks in parallel (map), then
+    merge the partial summaries in as many rounds as needed (reduce).
+
+    `progress(label, done, total)` is called as chunks complete.
+    """
+
+    chunks = split_into_chunks(text)
+
+    # Files skipped at extraction (too large) are reported, not summarized
+    notices = "\n".join(SKIP_NOTICE.findall(text))
+    if not chunks:
+        return "\n\n".join(
+            filter(None, ["No readable document text was found to summarize.", notices])
+        )
+
+    try:
+        summaries = _run_round(
+            model, "map", chunks, MAP_PROMPT, "Summarizing sections", progress
+        )
+
+        rounds = 0
+        while len(summaries) > 1:
+            rounds += 1
+            groups = _pack(summaries, SUMMARY_CHUNK_CHARS, sep="\n\n---\n\n")
+
+            # Summaries too long to pair up: force progress by merging two at a time
+            if len(groups) == len(summaries):
+                groups = [
+                    "\n\n---\n\n".join(summaries[i : i + 2])
+                    for i in range(0, len(summaries), 2)
+                ]
+
+            summaries = _run_round(
+                model,
+                "reduce",
+                groups,
+                REDUCE_PROMPT,
+                f"Merging summaries (round {rounds})",
+                progress,
+            )
+
+        return f"{summaries[0]}\n\n{notices}" if notices else summaries[0]
+
+    except Exception as e:
+        logger.error(f"Summarization failed: {e}")
+        return ERROR_REPLY
@@ -0,0 +1,136 @@
+import math
+import re
+from collections import Counter
+
+PAGE_BREAK = "\f"
+
+# Only trim line ends for these: indentation is content in code/text files,
+# and to_csv() tables are already compact (spaces inside quoted cells are data)
+KEEP_INLINE_SPACING = [".py", ".js", ".md", ".txt", ".csv", ".xlsx", ".xls"]
+
+EDGE_LINES = 2  # lines checked at the top and bottom of every page
+MIN_PAGES = 3
+MIN_REPEATS = 3  # a line must come back at least this often after its first use
+PAGE_NUMBER = re.compile(
+    r"^(page\s*)?[-–]?\s*\d+\s*[-–]?(\s*(of|/)\s*\d+)?$", re.IGNORECASE
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough token count (~4 characters per token). Good enough to compare
+    the same text before and after normalization.
+    """
+    return math.ceil(len(text) / 4)
+
+
+def normalize_text(text: str, suffix: str) -> str:
+    """
+    Shrink extracted text without dropping content:
+    - PDFs lose headers/footers repeated across pages and bare page numbers
+    - runs of spaces/tabs collapse to one (not in code/text files or tables)
+    - trailing whitespace goes, blank lines collapse to one
+    """
+    suffix = suffix.lower()
+
+    if suffix == ".pdf":
+        text = strip_page_furniture(text)
+
+    collapse_inline = suffix not in KEEP_INLINE_SPACING
+    pages = [
+        _collapse_whitespace(page, collapse_inline)
+        for page in text.split(PAGE_BREAK)
+    ]
+    return PAGE_BREAK.join(page for page in pages if page)
+
+
+def _collapse_whitespace(text: str, collapse_inline: bool) -> str:
+    lines = []
+    for line in text.splitlines():
+        line = line.rstrip()
+        if collapse_inline:
+            line = re.sub(r"[ \t]+", " ", line).lstrip()
+        lines.append(line)
+
+    text = "\n".join(lines)
+    text = re.sub(r"\n{3,}", "\n\n", text)
+    return text.strip("\n")
+
+
+def _line_key(line: str) -> str:
+    # "Report | Page 3 of 10" and "Report | Page 4 of 10" are the same footer
+    key = " ".join(line.lower().split())
+    return re.sub(r"(page\s*)\d+(\s*(of|/)\s*)?", r"\1#\2", key)
+
+
+def strip_page_furniture(text: str) -> str:
+    """
+    Remove repeats of lines that come back at the top or bottom of most
+    pages (running headers/footers), keeping the first occurrence, and bare
+    page numbers that count up with the pages.
+    """
+    pages = [page.splitlines() for page in text.split(PAGE_BREAK)]
+
+    # Too few pages to tell furniture from content
+    if len(pages) < MIN_PAGES:
+        return text
+
+    def content(lines):
+        return [i for i, line in enumerate(lines) if line.strip()]
+
+    def edges(lines):
+        idx = content(lines)
+        return set(idx[:EDGE_LINES] + idx[-EDGE_LINES:])
+
+    counts = Counter()
+    for lines in pages:
+        counts.update({_line_key(lines[i]) for i in edges(lines)})
+    threshold = math.ceil(len(pages) / 2)
+    repeated = {
+        key
+        for key, n in counts.items()
+        if n >= max(threshold, MIN_REPEATS + 1)
+    }
+
+    numbered = set()
+    for pick in (lambda idx: idx[:1], lambda idx: idx[-1:]):
+        numbered |= _page_number_lines(pages, pick, content, threshold)
+
+    seen = set()
+    cleaned = []
+    for p, lines in enumerate(pages):
+        drop = {i for q, i in numbered if q == p}
+        for i in sorted(edges(lines)):
+            key = _line_key(lines[i])
+            if key not in repeated:
+                continue
+            # First occurrence stays: a title or table header is content once
+            if key in seen:
+                drop.add(i)
+            seen.add(key)
+        cleaned.append("\n".join(l for i, l in enumerate(lines) if i not in drop))
+
+    return PAGE_BREAK.join(cleaned)
+
+
+def _page_number_lines(pages, pick, content, threshold) -> set:
+    """
+    (page, line) pairs at one edge (first or last line) holding a bare
+    number that tracks the page index on most pages. A lone number that
+    doesn't follow the pages (a table cell, a year) is content and stays.
+    """
+    hits = []
+    for p, lines in enumerate(pages):
+        for i in pick(content(lines)):
+            if PAGE_NUMBER.match(lines[i].strip()):
+                number = int(re.search(r"\d+", lines[i]).group())
+                hits.append((p, i, number - p))
+
+    offsets = Counter(offset for _, _, offset in hits)
+    if not offsets:
+        return set()
+
+    offset, n = offsets.most_common(1)[0]
+    if n < threshold:
+        return set()
+    return {(p, i) for p, i, o in hits if o == offset}
@@ -0,0 +1,171 @@
+import contextvars
+import json
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from config.settings import SLOW_TURN_MS, TRACE_SAMPLE_RATE
+from storage import connection
+from utils.logger import setup_logger
+
+logger = setup_logger("tracing")
+slow_logger = setup_logger("slow-turns")
+
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+
+# Ollama reports durations in nanoseconds
+OLLAMA_FIELDS = {
+    "prompt_eval_count": ("prompt_eval_count", 1),
+    "prompt_eval_duration": ("prompt_eval_ms", 1e-6),
+    "eval_count": ("eval_count", 1),
+    "eval_duration": ("eval_ms", 1e-6),
+    "load_duration": ("load_ms", 1e-6),
+}
+
+
+class Trace:
+    """
+    Timed stages of one chat turn. Repeated stages accumulate, and stages
+    run in parallel (summarization) may add up to more than the wall time.
+    """
+
+    def __init__(self, kind: str, chat_id: int, username: str):
+        self.kind = kind
+        self.chat_id = chat_id
+        self.username = username
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.ollama = {column: 0 for column, _ in OLLAMA_FIELDS.values()}
+        self._lock = threading.Lock()
+
+    def add_stage(self, name: str, ms: float):
+        with self._lock:
+            self.stages[name] = self.stages.get(name, 0.0) + ms
+
+    def add_ollama_stats(self, data: dict):
+        with self._lock:
+            for field, (column, scale) in OLLAMA_FIELDS.items():
+                self.ollama[column] += (data.get(field) or 0) * scale
+
+
+@contextmanager
+def span(name: str):
+    """
+    Time a stage of the current turn. No-op outside a traced turn.
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        yield
+        return
+
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add_stage(name, (time.perf_counter() - started) * 1000)
+
+
+def record_ollama_response(data: dict, wall_ms: float):
+    """
+    Attach Ollama's own timings to the current turn. Whatever part of the
+    HTTP round trip Ollama did not spend working is queueing + network.
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        return
+
+    trace.add_ollama_stats(data)
+    total_ms = (data.get("total_duration") or 0) * 1e-6
+    if total_ms:
+        trace.add_stage("ollama_queue", max(wall_ms - total_ms, 0.0))
+
+
+@contextmanager
+def trace_turn(kind: str, chat_id: int, username: str):
+    """
+    Trace one chat turn. Sampled turns are stored; slow turns are always
+    stored and written to the slow log.
+    """
+    trace = Trace(kind, chat_id, username)
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+        _finish(trace)
+
+
+def _finish(trace: Trace):
+    total_ms = (time.perf_counter() - trace.started) * 1000
+    slow = total_ms >= SLOW_TURN_MS
+
+    if slow:
+        breakdown = ", ".join(
+            f"{name}={ms:.0f}ms"
+            for name, ms in sorted(trace.stages.items(), key=lambda s: -s[1])
+        )
+        slow_logger.warning(
+            f"Slow {trace.kind} turn: {total_ms:.0f}ms chat={trace.chat_id} "
+            f"user={trace.username} [{breakdown}] "
+            f"prompt_tokens={trace.ollama['prompt_eval_count']} "
+            f"gen_tokens={trace.ollama['eval_count']}"
+        )
+
+    if not slow and random.random() >= TRACE_SAMPLE_RATE:
+        return
+
+    try:
+        save_trace(trace, total_ms, slow)
+    except Exception as e:
+        # Tracing must never break a chat turn
+        logger.error(f"Failed to save trace: {e}")
+
+
+# =========================
+# TRACE STORE
+# =========================
+
+
+def save_trace(trace: Trace, total_ms: float, slow: bool):
+    stages = {name: round(ms, 1) for name, ms in trace.stages.items()}
+
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            """
+            INSERT INTO turn_traces (
+                chat_id, username, kind, total_ms, stages,
+                prompt_eval_count, prompt_eval_ms, eval_count, eval_ms, load_ms, slow
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                trace.chat_id,
+                trace.username,
+                trace.kind,
+                round(total_ms, 1),
+                json.dumps(stages, separators=(",", ":")),
+                int(trace.ollama["prompt_eval_count"]),
+                round(trace.ollama["prompt_eval_ms"], 1),
+                int(trace.ollama["eval_count"]),
+                round(trace.ollama["eval_ms"], 1),
+                round(trace.ollama["load_ms"], 1),
+                int(slow),
+            ),
+        )
+        conn.commit()
+
+
+def get_slowest_turns(limit: int = 50):
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            """
+            SELECT created_at, username, chat_id, kind, total_ms, stages,
+                   prompt_eval_count, prompt_eval_ms, eval_count, eval_ms, load_ms
+            FROM turn_traces ORDER BY total_ms DESC LIMIT ?
+            """,
+            (limit,),
+        )
+        rows = cur.fetchall()
+    return rows
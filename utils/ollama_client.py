@@ -1,7 +1,10 @@
 import requests
-from pathlib import Path
 import logging
 import os
+import time
+
+from storage import UPLOAD_BASE
+from tracing import record_ollama_response, span
 
 # =========================
 # OLLAMA CONFIG (AUTO)
@@ -32,28 +35,30 @@ clearly say that no document has been uploaded yet.
     document_text = ""
 
     # ---------- READ EXTRACTED DOCUMENT ----------
-    extracted_file = Path(f"data/uploads/{chat_id}/extracted_text.txt")
+    with span("read_document"):
+        chat_upload_dir = UPLOAD_BASE / str(chat_id)
+        extracted_file = chat_upload_dir / "extracted_text.txt"
 
-    if extracted_file.exists():
-        document_text = extracted_file.read_text(
-            encoding="utf-8",
-            errors="ignore",
-        )
+        if extracted_file.exists():
+            document_text = extracted_file.read_text(
+                encoding="utf-8",
+                errors="ignore",
+            )
 
-    # ---------- READ FILE NAMES ----------
-    uploaded_files = []
-    chat_upload_dir = Path(f"data/uploads/{chat_id}")
+        # ---------- READ FILE NAMES ----------
+        uploaded_files = []
 
-    if chat_upload_dir.exists():
-        for f in chat_upload_dir.iterdir():
-            if f.is_file() and f.name != "extracted_text.txt":
-                uploaded_files.append(f.name)
+        if chat_upload_dir.exists():
+            for f in chat_upload_dir.iterdir():
+                if f.is_file() and f.name != "extracted_text.txt":
+                    uploaded_files.append(f.name)
 
-    file_sources = ", ".join(uploaded_files) if uploaded_files else "Unknown file"
+        file_sources = ", ".join(uploaded_files) if uploaded_files else "Unknown file"
 
     # ---------- DOCUMENT-AWARE PROMPT ----------
-    if document_text.strip():
-        system_prompt = f"""
+    with span("build_prompt"):
+        if document_text.strip():
+            system_prompt = f"""
 You are a helpful, conversational AI assistant.
 
 You can:
@@ -77,31 +82,58 @@ Uploaded document sources:
 </Document Context>
 """
 
-    # ---------- BUILD MESSAGE PAYLOAD ----------
-    ollama_messages = [{"role": "system", "content": system_prompt}]
+        # ---------- BUILD MESSAGE PAYLOAD ----------
+        ollama_messages = [{"role": "system", "content": system_prompt}]
+
+        for role, content in messages:
+            ollama_messages.append({"role": role, "content": content})
+
+        payload = {
+            "model": model,
+            "messages": ollama_messages,
+            "stream": False,
+        }
+
+    # ---------- SEND TO OLLAMA ----------
+    try:
+        logger.info(f"Sending request to Ollama @ {OLLAMA_BASE_URL}")
+        return _post_chat(payload, timeout=120)
+
+    except Exception as e:
+        logger.error(f"Ollama error: {e}")
+        return "⚠️ Error communicating with Ollama. Is Ollama running?"
+
 
-    for role, content in messages:
-        ollama_messages.append({"role": role, "content": content})
+def generate_completion(model: str, prompt: str, timeout: int = 120) -> str:
+    """
+    Send a single stand-alone prompt to Ollama (no history, no document context).
+    Raises on failure so callers can decide what to keep.
+    """
 
     payload = {
         "model": model,
-        "messages": ollama_messages,
+        "messages": [{"role": "user", "content": prompt}],
         "stream": False,
     }
 
-    # ---------- SEND TO OLLAMA ----------
-    try:
-        logger.info(f"Sending request to Ollama @ {OLLAMA_BASE_URL}")
+    logger.info(f"Sending completion request to Ollama @ {OLLAMA_BASE_URL}")
+    return _post_chat(payload, timeout=timeout)
+
 
+def _post_chat(payload: dict, timeout: int) -> str:
+    """
+    POST to /api/chat and attach Ollama's timings to the current trace.
+    """
+
+    started = time.perf_counter()
+    with span("ollama_request"):
         response = requests.post(
             f"{OLLAMA_BASE_URL}/api/chat",
             json=payload,
-            timeout=120,
+            timeout=timeout,
         )
-
         response.raise_for_status()
-        return response.json()["message"]["content"]
+        data = response.json()
 
-    except Exception as e:
-        logger.error(f"Ollama error: {e}")
-        return "⚠️ Error communicating with Ollama. Is Ollama running?"
+    record_ollama_response(data, (time.perf_counter() - started) * 1000)
+    return data["message"]["content"]